@@ -0,0 +1,38 @@
+#!/usr/bin/env python3.12
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+SRC_DIR = BASE_DIR / "src"
+
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from recetona.mcp_app import CATALOG_PARQUET_PATH, build_catalog_parquet
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Genera rag_cache/catalog.parquet a partir de "
+            "rag_cache/chunks.csv o mercadona_data.xlsx para que el "
+            "servidor MCP cargue el catalogo sin parsear CSV/XLSX."
+        )
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=CATALOG_PARQUET_PATH,
+        help="Fichero Parquet generado.",
+    )
+    args = parser.parse_args()
+
+    output_path = build_catalog_parquet(args.output)
+    print(f"Catalogo Parquet: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3.12
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from local_rag_server import (
+    NOTEBOOK_PATH,
+    NOTEBOOK_RUNTIME_MODULE_PATH,
+    freeze_notebook_runtime,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Extrae las celdas de runtime de mercadona_rag_notebook.ipynb "
+            "a lib/recetona_runtime.py para importarlas sin parsear el "
+            "notebook en cada arranque."
+        )
+    )
+    parser.add_argument(
+        "--notebook",
+        type=Path,
+        default=NOTEBOOK_PATH,
+        help="Notebook de origen.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=NOTEBOOK_RUNTIME_MODULE_PATH,
+        help="Modulo Python generado.",
+    )
+    args = parser.parse_args()
+
+    module_path = freeze_notebook_runtime(args.notebook, args.output)
+    print(f"Runtime congelado en: {module_path}")
+
+
+if __name__ == "__main__":
+    main()
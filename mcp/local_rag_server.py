@@ -1,24 +1,65 @@
 #!/usr/bin/env python3.12
 import argparse
-import json
+import asyncio
+import copy
+import functools
+import hashlib
+import importlib.util
+import inspect
 import logging
+import marshal
+import math
 import os
 import re
 import sys
 import threading
+import time
 import traceback
 import unicodedata
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from types import CodeType
 from typing import Any
 
+import msgpack
+import numpy as np
+import orjson
+import uvicorn
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
 BASE_DIR = Path(__file__).resolve().parent
 NOTEBOOK_PATH = BASE_DIR / "mercadona_rag_notebook.ipynb"
+NOTEBOOK_RUNTIME_MODULE_PATH = BASE_DIR / "lib" / "recetona_runtime.py"
+NOTEBOOK_RUNTIME_MODULE_NAME = "recetona_runtime"
+NOTEBOOK_RUNTIME_HASH_PREFIX = "# notebook-sha256: "
+NOTEBOOK_RUNTIME_RENDER_HASH_PREFIX = "# render-sha256: "
+RUNTIME_BASE_DIR_GLOBAL = "__RECETONA_BASE_DIR__"
+RUNTIME_CACHE_DIR_GLOBAL = "__RECETONA_CACHE_DIR__"
+RUNTIME_LOAD_EMBEDDINGS_GLOBAL = "__RECETONA_LOAD_EMBEDDINGS__"
+RUNTIME_TOP_K_GLOBAL = "__RECETONA_TOP_K__"
+RUNTIME_SAVE_CHUNKS_GLOBAL = "__RECETONA_SAVE_CHUNKS__"
+NOTEBOOK_CODE_CACHE_GLOB = "runtime-*.pyc"
+EMBEDDINGS_FP16_FILENAME = "embeddings.fp16.npy"
+SEMANTIC_SCORES_BLOCK_ROWS = 512
+MSGPACK_MEDIA_TYPE = "application/msgpack"
 ENV_PATH = BASE_DIR / ".env"
 RUNTIME_BASE_DIR_ENV = "RECETONA_RUNTIME_BASE_DIR"
 RUNTIME_CACHE_DIR_ENV = "RECETONA_RAG_CACHE_DIR"
 RAG_CACHE_S3_BUCKET_ENV = "RECETONA_RAG_CACHE_S3_BUCKET"
 RAG_CACHE_S3_PREFIX_ENV = "RECETONA_RAG_CACHE_S3_PREFIX"
+RUNTIME_WORKERS_ENV = "RECETONA_WORKERS"
+DEFAULT_RUNTIME_WORKERS = 4
+ASK_CACHE_SIZE_ENV = "RECETONA_ASK_CACHE_SIZE"
+DEFAULT_ASK_CACHE_SIZE = 512
+ASK_CACHE_TTL_ENV = "RECETONA_ASK_CACHE_TTL_SECONDS"
+DEFAULT_ASK_CACHE_TTL_SECONDS = 3600
+EMBEDDINGS_FP16_ENV = "RECETONA_EMBEDDINGS_FP16"
 REQUIRED_RAG_CACHE_FILES = ("chunks.csv", "embeddings.npy")
 RAW_NUT_INGREDIENT_TOKENS = {
     "almendra",
@@ -89,6 +130,12 @@ BEEF_INGREDIENT_PATTERN = re.compile(
 STEW_RECIPE_PATTERN = re.compile(
     r"\b(?:estofad\w*|guis\w*|ragu\w*|cocid\w*)\b"
 )
+NOTEBOOK_BASE_DIR_LITERAL_PATTERN = re.compile(
+    r"(['\"])/home/wencm/(?:RecetONA|Alimentación)([^'\"\n]*)\1"
+)
+NOTEBOOK_ARGSORT_TOP_K_PATTERN = re.compile(r"np\.argsort\(-(\w+)\)\[:(\w+)\]")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
 NON_RECIPE_TAXONOMY_PATTERN = re.compile(
     r"\b("
     r"botiquin|colonia|cuidado|farmacia|fitoterapia|gato|"
@@ -134,6 +181,45 @@ def get_runtime_rag_cache_paths() -> dict[str, Path]:
     return {name: cache_dir / name for name in REQUIRED_RAG_CACHE_FILES}
 
 
+def _get_int_env(name: str, default: int) -> int:
+    raw_value = os.getenv(name, "").strip()
+    if not raw_value:
+        return default
+    try:
+        return int(raw_value)
+    except ValueError:
+        logging.warning(
+            "Valor invalido en %s=%r; se usa %d.",
+            name,
+            raw_value,
+            default,
+        )
+        return default
+
+
+def _get_bool_env(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def get_runtime_workers() -> int:
+    return max(1, _get_int_env(RUNTIME_WORKERS_ENV, DEFAULT_RUNTIME_WORKERS))
+
+
+def get_ask_cache_size() -> int:
+    return max(0, _get_int_env(ASK_CACHE_SIZE_ENV, DEFAULT_ASK_CACHE_SIZE))
+
+
+def get_ask_cache_ttl_seconds() -> int:
+    return max(
+        0,
+        _get_int_env(ASK_CACHE_TTL_ENV, DEFAULT_ASK_CACHE_TTL_SECONDS),
+    )
+
+
+def get_embeddings_fp16_enabled() -> bool:
+    return _get_bool_env(EMBEDDINGS_FP16_ENV)
+
+
 def _get_rag_cache_s3_config() -> tuple[str, str]:
     bucket_name = os.getenv(RAG_CACHE_S3_BUCKET_ENV, "").strip()
     prefix = os.getenv(RAG_CACHE_S3_PREFIX_ENV, "").strip().strip("/")
@@ -231,7 +317,7 @@ def ensure_runtime_rag_cache(
 
 
 def _extract_code_cells(notebook_path: Path) -> list[str]:
-    data = json.loads(notebook_path.read_text(encoding="utf-8"))
+    data = orjson.loads(notebook_path.read_bytes())
     code_cells = []
     for cell in data.get("cells", []):
         if cell.get("cell_type") != "code":
@@ -261,6 +347,123 @@ def _select_runtime_cells(code_cells: list[str]) -> list[str]:
     return selected
 
 
+def _replace_notebook_base_dir_literal(match: re.Match) -> str:
+    quote, suffix = match.group(1), match.group(2)
+    if not suffix:
+        return RUNTIME_BASE_DIR_GLOBAL
+    return f"({RUNTIME_BASE_DIR_GLOBAL} + {quote}{suffix}{quote})"
+
+
+def render_notebook_runtime_source(runtime_cells: list[str]) -> str:
+    code = "\n\n".join(runtime_cells)
+    code = NOTEBOOK_BASE_DIR_LITERAL_PATTERN.sub(
+        _replace_notebook_base_dir_literal,
+        code,
+    )
+    code = code.replace(
+        "CACHE_DIR = BASE_DIR / 'rag_cache'",
+        f"CACHE_DIR = Path({RUNTIME_CACHE_DIR_GLOBAL})",
+    )
+    code = code.replace(
+        "embeddings = ensure_embeddings(chunks)",
+        f"embeddings = {RUNTIME_LOAD_EMBEDDINGS_GLOBAL}("
+        "ensure_embeddings, chunks)",
+    )
+    code = code.replace(
+        "chunks.to_csv(CHUNKS_CSV, index=False)",
+        f"{RUNTIME_SAVE_CHUNKS_GLOBAL}(chunks, CHUNKS_CSV)",
+    )
+    return NOTEBOOK_ARGSORT_TOP_K_PATTERN.sub(
+        rf"{RUNTIME_TOP_K_GLOBAL}(\1, \2)",
+        code,
+    )
+
+
+def _notebook_sha256(notebook_path: Path) -> str:
+    return hashlib.sha256(notebook_path.read_bytes()).hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def _notebook_render_sha256() -> str:
+    # Huella de las reglas que convierten el notebook en codigo: si cambian,
+    # el modulo congelado y el bytecode cacheado quedan obsoletos.
+    digest = hashlib.sha256()
+    for function in (
+        _select_runtime_cells,
+        _replace_notebook_base_dir_literal,
+        render_notebook_runtime_source,
+    ):
+        digest.update(inspect.getsource(function).encode("utf-8"))
+    for rule in (
+        NOTEBOOK_BASE_DIR_LITERAL_PATTERN.pattern,
+        NOTEBOOK_ARGSORT_TOP_K_PATTERN.pattern,
+        RUNTIME_BASE_DIR_GLOBAL,
+        RUNTIME_CACHE_DIR_GLOBAL,
+        RUNTIME_LOAD_EMBEDDINGS_GLOBAL,
+        RUNTIME_TOP_K_GLOBAL,
+        RUNTIME_SAVE_CHUNKS_GLOBAL,
+    ):
+        digest.update(rule.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _frozen_notebook_runtime_header(notebook_path: Path) -> str:
+    return (
+        f"{NOTEBOOK_RUNTIME_HASH_PREFIX}{_notebook_sha256(notebook_path)}\n"
+        f"{NOTEBOOK_RUNTIME_RENDER_HASH_PREFIX}{_notebook_render_sha256()}\n"
+    )
+
+
+def freeze_notebook_runtime(
+    notebook_path: Path,
+    module_path: Path = NOTEBOOK_RUNTIME_MODULE_PATH,
+) -> Path:
+    runtime_cells = _select_runtime_cells(_extract_code_cells(notebook_path))
+    source = render_notebook_runtime_source(runtime_cells)
+    header = (
+        f"{_frozen_notebook_runtime_header(notebook_path)}"
+        f"# Generado por freeze_notebook_runtime.py desde "
+        f"{notebook_path.name}.\n# No editar a mano.\n"
+        f"# {RUNTIME_BASE_DIR_GLOBAL}, {RUNTIME_CACHE_DIR_GLOBAL},\n"
+        f"# {RUNTIME_LOAD_EMBEDDINGS_GLOBAL}, {RUNTIME_TOP_K_GLOBAL} y\n"
+        f"# {RUNTIME_SAVE_CHUNKS_GLOBAL} se inyectan al importar.\n\n"
+    )
+    module_path.parent.mkdir(parents=True, exist_ok=True)
+    module_path.write_text(header + source + "\n", encoding="utf-8")
+    return module_path
+
+
+def _load_frozen_notebook_runtime(
+    notebook_path: Path,
+    runtime_globals: dict[str, Any],
+) -> dict | None:
+    module_path = NOTEBOOK_RUNTIME_MODULE_PATH
+    if not module_path.exists() or not notebook_path.exists():
+        return None
+
+    expected_header = _frozen_notebook_runtime_header(notebook_path)
+    with module_path.open(encoding="utf-8") as module_file:
+        header = module_file.readline() + module_file.readline()
+    if header != expected_header:
+        logging.warning(
+            "Runtime congelado %s desactualizado respecto a %s; "
+            "se ejecuta el notebook.",
+            module_path,
+            notebook_path,
+        )
+        return None
+
+    spec = importlib.util.spec_from_file_location(
+        NOTEBOOK_RUNTIME_MODULE_NAME,
+        module_path,
+    )
+    module = importlib.util.module_from_spec(spec)
+    module.__dict__.update(runtime_globals)
+    spec.loader.exec_module(module)
+    logging.info("Runtime cargado desde modulo congelado: %s", module_path)
+    return vars(module)
+
+
 def _normalize_matching_text(value: Any) -> str:
     text = str(value or "").lower().strip()
     text = unicodedata.normalize("NFD", text)
@@ -269,7 +472,7 @@ def _normalize_matching_text(value: Any) -> str:
 
 def _tokenize_normalized_text(value: Any) -> set[str]:
     normalized = _normalize_matching_text(value)
-    return set(re.findall(r"[a-z0-9]+", normalized))
+    return set(TOKEN_PATTERN.findall(normalized))
 
 
 def _candidate_has_non_recipe_taxonomy(row: Any) -> bool:
@@ -494,7 +697,241 @@ def _build_recipe_generation_prompt(
     )
 
 
+def load_runtime_embeddings(
+    ensure_embeddings: Any,
+    chunks_df: Any,
+    *,
+    embeddings_path: Path,
+) -> np.ndarray:
+    """Devuelve la matriz de embeddings del runtime.
+
+    Por defecto es la matriz float32 residente de `ensure_embeddings`. Con
+    RECETONA_EMBEDDINGS_FP16 activo se mapea desde disco una copia float16
+    (`embeddings.fp16.npy`), que se regenera desde `embeddings.npy` cuando
+    falta, es mas antigua o no cuadra con el numero de chunks.
+    """
+    if not get_embeddings_fp16_enabled():
+        return np.asarray(ensure_embeddings(chunks_df), dtype=np.float32)
+
+    embeddings_path = Path(embeddings_path)
+    fp16_path = embeddings_path.with_name(EMBEDDINGS_FP16_FILENAME)
+    if fp16_path.exists() and (
+        not embeddings_path.exists()
+        or fp16_path.stat().st_mtime >= embeddings_path.stat().st_mtime
+    ):
+        embeddings = np.load(fp16_path, mmap_mode="r")
+        if embeddings.shape[0] == len(chunks_df):
+            return embeddings
+
+    embeddings = np.asarray(ensure_embeddings(chunks_df), dtype=np.float16)
+    if not embeddings.size:
+        return embeddings
+    temporary_path = fp16_path.with_name(f".{fp16_path.name}.tmp")
+    try:
+        with temporary_path.open("wb") as handle:
+            np.save(handle, embeddings)
+        temporary_path.replace(fp16_path)
+    except OSError as exc:
+        logging.warning(
+            "No se pudo guardar %s (%s); se usan en memoria.", fp16_path, exc
+        )
+        return embeddings
+    return np.load(fp16_path, mmap_mode="r")
+
+
+def save_runtime_chunks(chunks_df: Any, chunks_path: Path) -> None:
+    """Escribe `chunks.csv` en un temporal y lo sustituye de golpe.
+
+    Asi el catalogo de las tools MCP nunca lee un CSV a medio escribir
+    mientras el runtime arranca.
+    """
+    chunks_path = Path(chunks_path)
+    temporary_path = chunks_path.with_name(f".{chunks_path.name}.tmp")
+    try:
+        chunks_df.to_csv(temporary_path, index=False)
+        temporary_path.replace(chunks_path)
+    finally:
+        temporary_path.unlink(missing_ok=True)
+
+
+def semantic_scores_from_embeddings(
+    embeddings: np.ndarray,
+    query_vectors: np.ndarray,
+    block_rows: int = SEMANTIC_SCORES_BLOCK_ROWS,
+) -> list[np.ndarray]:
+    query_matrix = np.asarray(query_vectors, dtype=np.float32)
+    query_matrix = query_matrix / (
+        np.linalg.norm(query_matrix, axis=1, keepdims=True) + 1e-12
+    )
+    if embeddings.dtype != np.float16:
+        scores = query_matrix @ np.asarray(embeddings, dtype=np.float32).T
+    else:
+        # numpy no usa BLAS en float16: se sube a float32 por bloques de
+        # filas para hacer un unico GEMM por bloque con todas las consultas.
+        scores = np.empty(
+            (len(query_matrix), len(embeddings)), dtype=np.float32
+        )
+        for start in range(0, len(embeddings), block_rows):
+            block = np.asarray(
+                embeddings[start : start + block_rows], dtype=np.float32
+            )
+            scores[:, start : start + len(block)] = query_matrix @ block.T
+    scores += 1.0
+    scores /= 2.0
+    return list(scores)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Equivale a `np.argsort(-scores)[:k]` sin ordenar todo el array."""
+    k = min(int(k), len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    negative_scores = -np.asarray(scores)
+    if k < len(negative_scores):
+        candidates = np.argpartition(negative_scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(negative_scores))
+    order = np.argsort(negative_scores[candidates], kind="stable")
+    return candidates[order]
+
+
+def build_postings_arrays(
+    postings: dict[str, list[tuple[int, int]]],
+) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    # Cada token pasa de una lista de (doc, tf) a dos arrays: filas y el
+    # factor 1 + log(tf) que usa el TF-IDF del notebook.
+    postings_arrays: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+    for token, rows in postings.items():
+        if not rows:
+            continue
+        doc_indices, term_freqs = zip(*rows)
+        postings_arrays[token] = (
+            np.asarray(doc_indices, dtype=np.intp),
+            1.0 + np.log(np.asarray(term_freqs, dtype=np.float64)),
+        )
+    return postings_arrays
+
+
+def tfidf_scores_from_postings_arrays(
+    q_tokens: list[str],
+    postings_arrays: dict[str, tuple[np.ndarray, np.ndarray]],
+    doc_freq: dict[str, int],
+    n_docs: int,
+) -> np.ndarray:
+    scores = np.zeros(n_docs, dtype=np.float32)
+    if not q_tokens:
+        return scores
+
+    for token, qtf in Counter(q_tokens).items():
+        token_postings = postings_arrays.get(token)
+        if token_postings is None:
+            continue
+
+        doc_indices, tf_weights = token_postings
+        idf = math.log((n_docs + 1) / (doc_freq[token] + 1)) + 1.0
+        q_weight = 1.0 + math.log(qtf)
+        # En un mismo token cada documento aparece una sola vez, asi que la
+        # suma indexada no pierde contribuciones.
+        scores[doc_indices] += q_weight * tf_weights * idf
+
+    max_score = float(scores.max())
+    if max_score > 0:
+        scores /= max_score
+    return scores
+
+
+def token_masks_from_postings_arrays(
+    tokens: set[str],
+    postings_arrays: dict[str, tuple[np.ndarray, np.ndarray]],
+    n_docs: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    if not tokens:
+        zeros = np.zeros(n_docs, dtype=bool)
+        return zeros, zeros
+
+    token_doc_indices = [
+        postings_arrays[token][0]
+        for token in tokens
+        if token in postings_arrays
+    ]
+    if not token_doc_indices:
+        zeros = np.zeros(n_docs, dtype=bool)
+        return zeros, zeros
+
+    token_counts = np.bincount(
+        np.concatenate(token_doc_indices), minlength=n_docs
+    )
+    return token_counts > 0, token_counts == len(tokens)
+
+
+def _patch_lexical_indexes(namespace: dict[str, Any]) -> None:
+    postings_arrays_by_id = {
+        id(namespace[name]): build_postings_arrays(namespace[name])
+        for name in ("POSTINGS", "ING_NAME_POSTINGS", "ING_DESC_POSTINGS")
+        if isinstance(namespace.get(name), dict)
+    }
+    if not postings_arrays_by_id or "N_DOCS" not in namespace:
+        return
+
+    original_tfidf = namespace.get("_tfidf_scores_index")
+    if callable(original_tfidf):
+
+        def _patched_tfidf_scores_index(q_tokens, postings, doc_freq):
+            postings_arrays = postings_arrays_by_id.get(id(postings))
+            if postings_arrays is None:
+                return original_tfidf(q_tokens, postings, doc_freq)
+            return tfidf_scores_from_postings_arrays(
+                q_tokens,
+                postings_arrays,
+                doc_freq,
+                namespace["N_DOCS"],
+            )
+
+        namespace["_tfidf_scores_index"] = _patched_tfidf_scores_index
+
+    ingredient_postings = namespace.get("ING_NAME_POSTINGS")
+    if (
+        callable(namespace.get("_ingredient_token_masks"))
+        and callable(namespace.get("tokenize"))
+        and id(ingredient_postings) in postings_arrays_by_id
+    ):
+        ingredient_postings_arrays = postings_arrays_by_id[
+            id(ingredient_postings)
+        ]
+
+        def _patched_ingredient_token_masks(ingredient):
+            stopwords = namespace.get("STOPWORDS", set())
+            tokens = {
+                token
+                for token in namespace["tokenize"](ingredient)
+                if token not in stopwords and len(token) > 2
+            }
+            return token_masks_from_postings_arrays(
+                tokens,
+                ingredient_postings_arrays,
+                namespace["N_DOCS"],
+            )
+
+        namespace["_ingredient_token_masks"] = _patched_ingredient_token_masks
+
+
 def _patch_notebook_runtime(namespace: dict[str, Any]) -> None:
+    _patch_lexical_indexes(namespace)
+
+    if "semantic_scores_batch" in namespace and "embeddings" in namespace:
+
+        def _patched_semantic_scores_batch(queries):
+            resp = namespace["client"].embeddings.create(
+                model=namespace["EMBED_MODEL"], input=queries
+            )
+            return semantic_scores_from_embeddings(
+                namespace["embeddings"],
+                [item.embedding for item in resp.data],
+            )
+
+        namespace["semantic_scores_batch"] = _patched_semantic_scores_batch
+
     original_retrieve = namespace.get("retrieve_products_for_ingredient")
     if callable(original_retrieve):
 
@@ -576,24 +1013,87 @@ def _patch_notebook_runtime(namespace: dict[str, Any]) -> None:
         )
 
 
+def _notebook_code_cache_path(notebook_path: Path, cache_dir: Path) -> Path:
+    # La clave cubre el notebook, las reglas de renderizado (las mismas que
+    # invalidan el modulo congelado) y la version de bytecode del interprete.
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(importlib.util.MAGIC_NUMBER)
+    digest.update(_notebook_render_sha256().encode("ascii"))
+    digest.update(notebook_path.read_bytes())
+    return cache_dir / f"runtime-{digest.hexdigest()}.pyc"
+
+
+def _compile_notebook_runtime(
+    notebook_path: Path, cache_dir: Path
+) -> CodeType:
+    cache_path = None
+    if notebook_path.exists():
+        cache_path = _notebook_code_cache_path(notebook_path, cache_dir)
+    if cache_path is not None and cache_path.exists():
+        try:
+            with cache_path.open("rb") as handle:
+                return marshal.load(handle)
+        except (EOFError, ValueError, TypeError) as exc:
+            logging.warning(
+                "Bytecode del notebook invalido en %s (%s); se recompila.",
+                cache_path,
+                exc,
+            )
+
+    runtime_cells = _select_runtime_cells(_extract_code_cells(notebook_path))
+    code = compile(
+        render_notebook_runtime_source(runtime_cells),
+        str(notebook_path),
+        "exec",
+    )
+    if cache_path is not None:
+        _store_notebook_code_cache(code, cache_path)
+    return code
+
+
+def _store_notebook_code_cache(code: CodeType, cache_path: Path) -> None:
+    temporary_path = cache_path.with_name(f".{cache_path.name}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with temporary_path.open("wb") as handle:
+            marshal.dump(code, handle)
+        temporary_path.replace(cache_path)
+        for stale_path in cache_path.parent.glob(NOTEBOOK_CODE_CACHE_GLOB):
+            if stale_path != cache_path:
+                stale_path.unlink(missing_ok=True)
+    except OSError as exc:
+        logging.warning(
+            "No se pudo guardar el bytecode del notebook en %s: %s",
+            cache_path,
+            exc,
+        )
+
+
 def build_notebook_runtime(notebook_path: Path) -> dict:
     cache_status = ensure_runtime_rag_cache(
         raise_on_error=False,
         eager_download=True,
     )
-    cells = _extract_code_cells(notebook_path)
-    runtime_cells = _select_runtime_cells(cells)
-
-    code = "\n\n".join(runtime_cells)
-    code = code.replace("/home/wencm/RecetONA", str(BASE_DIR))
-    code = code.replace("/home/wencm/Alimentación", str(BASE_DIR))
-    code = code.replace(
-        "CACHE_DIR = BASE_DIR / 'rag_cache'",
-        f"CACHE_DIR = Path({str(cache_status['cache_dir'])!r})",
-    )
-
-    namespace: dict = {"__name__": "__recetona_notebook_runtime__"}
-    exec(compile(code, str(notebook_path), "exec"), namespace, namespace)
+    runtime_globals = {
+        RUNTIME_BASE_DIR_GLOBAL: str(BASE_DIR),
+        RUNTIME_CACHE_DIR_GLOBAL: str(cache_status["cache_dir"]),
+        RUNTIME_LOAD_EMBEDDINGS_GLOBAL: functools.partial(
+            load_runtime_embeddings,
+            embeddings_path=Path(cache_status["cache_dir"]) / "embeddings.npy",
+        ),
+        RUNTIME_TOP_K_GLOBAL: top_k_indices,
+        RUNTIME_SAVE_CHUNKS_GLOBAL: save_runtime_chunks,
+    }
+    namespace = _load_frozen_notebook_runtime(notebook_path, runtime_globals)
+    if namespace is None:
+        code = _compile_notebook_runtime(
+            notebook_path, Path(cache_status["cache_dir"])
+        )
+        namespace = {
+            "__name__": "__recetona_notebook_runtime__",
+            **runtime_globals,
+        }
+        exec(code, namespace, namespace)
     _patch_notebook_runtime(namespace)
     resolved_embed_model = (
         os.getenv("RECETONA_EMBED_MODEL", "").strip()
@@ -620,25 +1120,140 @@ def build_notebook_runtime(notebook_path: Path) -> dict:
     return namespace
 
 
+def _normalize_ask_cache_key(message: str) -> str:
+    return WHITESPACE_PATTERN.sub(" ", message.strip().lower())
+
+
+class AskResponseCache:
+    """LRU con caducidad opcional para respuestas completas de ask_agent."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float = 0):
+        self._maxsize = maxsize
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def get(self, key: str) -> dict | None:
+        if self._maxsize <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, response = entry
+            if (
+                self._ttl_seconds > 0
+                and time.monotonic() - stored_at > self._ttl_seconds
+            ):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+
+        return copy.deepcopy(response)
+
+    def put(self, key: str, response: dict) -> None:
+        if self._maxsize <= 0:
+            return
+
+        stored_response = copy.deepcopy(response)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), stored_response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
 class NotebookRagService:
     def __init__(self, notebook_path: Path):
-        self._lock = threading.Lock()
         self._ns = build_notebook_runtime(notebook_path)
         self._ask_agent = self._ns["ask_agent"]
+        # ask_agent solo lee el estado del notebook (chunks, embeddings e
+        # indices lexicos) y el cliente de OpenAI es thread-safe, asi que no
+        # hace falta serializar las consultas: el pool limita la concurrencia.
+        self._pool = ThreadPoolExecutor(
+            max_workers=get_runtime_workers(),
+            thread_name_prefix="recetona-ask",
+        )
+        self._response_cache = AskResponseCache(
+            get_ask_cache_size(),
+            ttl_seconds=get_ask_cache_ttl_seconds(),
+        )
+        # El unico estado compartido que se muta es el registro de preguntas
+        # en curso; su lock solo se toma para consultarlo, nunca durante la
+        # llamada a OpenAI.
+        self._inflight: dict[str, Future] = {}
+        self._inflight_lock = threading.RLock()
+
+    def _run_ask_agent(self, message: str) -> dict:
+        return self._ask_agent(
+            message,
+            top_k=35,
+            retrieval_mode="hybrid",
+            alpha=0.65,
+            recipe_mode="auto",
+            use_ingredient_tool=True,
+            candidates_per_ingredient=12,
+        )
 
-    def ask(self, message: str) -> dict:
-        with self._lock:
-            result = self._ask_agent(
-                message,
-                top_k=35,
-                retrieval_mode="hybrid",
-                alpha=0.65,
-                recipe_mode="auto",
-                use_ingredient_tool=True,
-                candidates_per_ingredient=12,
+    def _answer(self, cache_key: str, message: str) -> dict:
+        return self._remember_response(cache_key, self._run_ask_agent(message))
+
+    def _submit_question(
+        self, cache_key: str, message: str
+    ) -> tuple[Future, bool]:
+        # Preguntas equivalentes que llegan a la vez comparten una sola
+        # ejecucion de ask_agent en lugar de repetir la llamada a OpenAI.
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            if future is not None:
+                return future, False
+
+            future = self._pool.submit(self._answer, cache_key, message)
+            self._inflight[cache_key] = future
+            future.add_done_callback(
+                lambda done: self._forget_question(cache_key, done)
             )
+            return future, True
+
+    def _forget_question(self, cache_key: str, future: Future) -> None:
+        with self._inflight_lock:
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+
+    def _start_question(
+        self, message: str
+    ) -> tuple[dict | None, Future | None, bool]:
+        cache_key = _normalize_ask_cache_key(message)
+        cached_response = self._response_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response, None, False
+
+        future, is_owner = self._submit_question(cache_key, message)
+        return None, future, is_owner
 
-        return {
+    @staticmethod
+    def _caller_response(response: dict, is_owner: bool) -> dict:
+        # Quien se une a una pregunta en curso recibe su propia copia.
+        return response if is_owner else copy.deepcopy(response)
+
+    def ask(self, message: str) -> dict:
+        cached_response, future, is_owner = self._start_question(message)
+        if future is None:
+            return cached_response
+        return self._caller_response(future.result(), is_owner)
+
+    async def ask_async(self, message: str) -> dict:
+        cached_response, future, is_owner = self._start_question(message)
+        if future is None:
+            return cached_response
+        # shield: cancelar una peticion no debe cancelar la ejecucion
+        # compartida con otras peticiones de la misma pregunta.
+        response = await asyncio.shield(asyncio.wrap_future(future))
+        return self._caller_response(response, is_owner)
+
+    def _remember_response(self, cache_key: str, result: dict) -> dict:
+        response = {
             "answer": str(result.get("answer", "")).strip(),
             "block_1": str(result.get("block_1", "")).strip(),
             "block_2": str(result.get("block_2", "")).strip(),
@@ -647,67 +1262,156 @@ class NotebookRagService:
             "cost_summary": result.get("cost_summary"),
             "inferred_ingredients": result.get("inferred_ingredients"),
         }
+        # Sin raw_response la receta del bloque 3 no se pudo generar (fallo
+        # de OpenAI): esa respuesta degradada no se guarda en la cache.
+        if result.get("raw_response") is None:
+            logging.warning(
+                "No se cachea la respuesta de %r: fallo el bloque 3.",
+                cache_key,
+            )
+            return response
+        self._response_cache.put(cache_key, response)
+        return response
 
 
-class LocalApiHandler(BaseHTTPRequestHandler):
-    service: NotebookRagService | None = None
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "columns") and hasattr(value, "to_dict"):
+        return value.to_dict(orient="records")
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Tipo no serializable a JSON: {type(value).__name__}")
 
-    def _send_json(self, status: int, payload: dict) -> None:
-        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
-        self.send_header("Content-Length", str(len(body)))
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.end_headers()
-        self.wfile.write(body)
 
-    def do_OPTIONS(self):
-        self._send_json(200, {"ok": True})
+def dumps_json(payload: Any) -> bytes:
+    return orjson.dumps(
+        payload,
+        default=_json_default,
+        option=orjson.OPT_SERIALIZE_NUMPY,
+    )
 
-    def do_GET(self):
-        if self.path == "/health":
-            self._send_json(200, {"ok": True, "service": "recetona-local-rag"})
-            return
-        self._send_json(404, {"error": "Ruta no encontrada"})
 
-    def do_POST(self):
-        if self.path != "/chat":
-            self._send_json(404, {"error": "Ruta no encontrada"})
-            return
+def _json_response(status: int, payload: Any) -> Response:
+    return Response(
+        dumps_json(payload),
+        status_code=status,
+        media_type="application/json",
+    )
 
-        length = int(self.headers.get("Content-Length", "0") or "0")
-        raw = self.rfile.read(length).decode("utf-8") if length else "{}"
-        try:
-            payload = json.loads(raw)
-        except json.JSONDecodeError:
-            self._send_json(400, {"error": "JSON invalido"})
-            return
 
-        message = str(payload.get("message", "")).strip()
-        if not message:
-            self._send_json(400, {"error": "Falta el campo 'message'"})
-            return
+def _media_range_quality(accept_header: str, media_types: set[str]) -> float:
+    quality = 0.0
+    for media_range in accept_header.split(","):
+        media_type, *params = (
+            part.strip().lower() for part in media_range.split(";")
+        )
+        if media_type not in media_types:
+            continue
+        range_quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    range_quality = float(value)
+                except ValueError:
+                    range_quality = 0.0
+        quality = max(quality, range_quality)
+    return quality
+
+
+def _prefers_msgpack(accept_header: str) -> bool:
+    msgpack_quality = _media_range_quality(accept_header, {MSGPACK_MEDIA_TYPE})
+    json_quality = _media_range_quality(
+        accept_header, {"application/json", "application/*", "*/*"}
+    )
+    return msgpack_quality > 0 and msgpack_quality >= json_quality
 
-        if self.service is None:
-            self._send_json(503, {"error": "Servicio no inicializado"})
-            return
 
-        try:
-            response = self.service.ask(message)
-            self._send_json(200, response)
-        except Exception as exc:
-            self._send_json(
-                500,
-                {
-                    "error": f"Fallo ejecutando ask_agent: {exc}",
-                    "traceback": traceback.format_exc(),
-                },
-            )
+def _api_response(request: Request, status: int, payload: Any) -> Response:
+    # JSON por defecto; msgpack solo si el cliente lo prefiere en Accept.
+    if _prefers_msgpack(request.headers.get("accept", "")):
+        return Response(
+            msgpack.packb(payload, default=_json_default, use_bin_type=True),
+            status_code=status,
+            media_type=MSGPACK_MEDIA_TYPE,
+            headers={"Vary": "Accept"},
+        )
+    response = _json_response(status, payload)
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+async def _health(request: Request) -> Response:
+    return _api_response(
+        request, 200, {"ok": True, "service": "recetona-local-rag"}
+    )
+
+
+async def _chat(request: Request) -> Response:
+    raw = await request.body() or b"{}"
+    try:
+        payload = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return _api_response(request, 400, {"error": "JSON invalido"})
+    if not isinstance(payload, dict):
+        return _api_response(request, 400, {"error": "JSON invalido"})
+
+    message = str(payload.get("message", "")).strip()
+    if not message:
+        return _api_response(
+            request, 400, {"error": "Falta el campo 'message'"}
+        )
+
+    service: NotebookRagService | None = request.app.state.service
+    if service is None:
+        return _api_response(
+            request, 503, {"error": "Servicio no inicializado"}
+        )
+
+    # La serializacion va dentro del try: un valor no serializable en la
+    # respuesta tambien devuelve el error en JSON con cabeceras CORS.
+    try:
+        response = await service.ask_async(message)
+        return _api_response(request, 200, response)
+    except Exception as exc:
+        return _api_response(
+            request,
+            500,
+            {
+                "error": f"Fallo ejecutando ask_agent: {exc}",
+                "traceback": traceback.format_exc(),
+            },
+        )
+
 
-    def log_message(self, fmt, *args):
-        logging.info("%s - %s", self.address_string(), fmt % args)
+async def _route_not_found(request: Request, exc: Exception) -> Response:
+    # CORSMiddleware solo atiende los preflight completos; cualquier otro
+    # OPTIONS responde 200 en todas las rutas.
+    if request.method == "OPTIONS":
+        return _json_response(200, {"ok": True})
+    return _json_response(404, {"error": "Ruta no encontrada"})
+
+
+def build_local_api_app(service: NotebookRagService | None) -> Starlette:
+    application = Starlette(
+        routes=[
+            Route("/health", _health, methods=["GET"]),
+            Route("/chat", _chat, methods=["POST"]),
+        ],
+        middleware=[
+            Middleware(
+                CORSMiddleware,
+                allow_origins=["*"],
+                allow_methods=["GET", "POST", "OPTIONS"],
+                allow_headers=["Content-Type"],
+            )
+        ],
+        exception_handlers={
+            404: _route_not_found,
+            405: _route_not_found,
+        },
+    )
+    application.state.service = service
+    return application
 
 
 def main() -> None:
@@ -730,18 +1434,12 @@ def main() -> None:
 
     logging.info("Inicializando runtime desde notebook: %s", NOTEBOOK_PATH)
     service = NotebookRagService(NOTEBOOK_PATH)
-    LocalApiHandler.service = service
+    application = build_local_api_app(service)
 
-    server = ThreadingHTTPServer((args.host, args.port), LocalApiHandler)
     logging.info("API local escuchando en http://%s:%d", args.host, args.port)
     logging.info("Endpoints: GET /health, POST /chat")
-
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        logging.info("Cerrando servidor...")
-    finally:
-        server.server_close()
+    uvicorn.run(application, host=args.host, port=args.port, workers=1)
+    logging.info("Cerrando servidor...")
 
 
 if __name__ == "__main__":
@@ -13,7 +13,7 @@ SOURCE_DIR = BASE_DIR / "src"
 if str(SOURCE_DIR) not in sys.path:
     sys.path.insert(0, str(SOURCE_DIR))
 
-from recetona.mcp_app import create_mcp
+from recetona.mcp_app import create_mcp, start_runtime_warmup
 
 
 def main() -> None:
@@ -27,6 +27,7 @@ def main() -> None:
         help="Transporte MCP (recomendado: stdio para Codex local).",
     )
     args = parser.parse_args()
+    start_runtime_warmup()
     mcp = create_mcp()
     mcp.run(transport=args.transport)
 
@@ -1,13 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import logging
 import os
 import re
 import sys
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from mcp.server.fastmcp import FastMCP
 from mcp.types import CallToolResult, TextContent, ToolAnnotations
 from starlette.middleware.cors import CORSMiddleware
@@ -27,21 +37,40 @@ from local_rag_server import (
 MCP_NAME = "RecetONA"
 RECIPE_WIDGET_URI = "ui://widget/recetona-recipe-v1.html"
 CATALOG_CACHE_PATH = PROJECT_ROOT / "rag_cache" / "chunks.csv"
+CATALOG_PARQUET_PATH = PROJECT_ROOT / "rag_cache" / "catalog.parquet"
+CATALOG_SOURCE_HASH_METADATA_KEY = b"recetona_source_sha256"
 EMBEDDINGS_CACHE_PATH = PROJECT_ROOT / "rag_cache" / "embeddings.npy"
 EXCEL_PATH = PROJECT_ROOT / "mercadona_data.xlsx"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
 
-_service: NotebookRagService | None = None
+_service_future: Future[NotebookRagService] | None = None
+_service_future_lock = threading.Lock()
+_catalog_lock = threading.Lock()
 _catalog_dataframe: pd.DataFrame | None = None
+_catalog_term_postings: _CatalogTermPostings | None = None
+_catalog_id_index: tuple[dict[str, int], dict[str, int]] | None = None
+_catalog_search_columns: dict[str, np.ndarray] | None = None
 _resolved_openai_api_key: str | None = None
 _resolved_openai_api_key_source: str | None = None
 
 
+@lru_cache(maxsize=65536)
 def _normalize(text: str) -> str:
     text = text.lower().strip()
-    return re.sub(r"\s+", " ", text)
+    return WHITESPACE_PATTERN.sub(" ", text)
 
 
 def _format_product_id(value: Any) -> str:
+    # La conversion se memoiza; los valores no hashables (o tipos numpy no
+    # derivados de int/float) se pasan a str antes de consultar la cache.
+    if not isinstance(value, (int, float, str)):
+        value = str(value)
+    return _format_product_id_cached(value)
+
+
+@lru_cache(maxsize=65536)
+def _format_product_id_cached(value: int | float | str) -> str:
     try:
         numeric_value = float(value)
     except Exception:
@@ -169,11 +198,7 @@ def _validate_recipe_runtime_assets() -> None:
     )
 
 
-def _get_service() -> NotebookRagService:
-    global _service
-    if _service is not None:
-        return _service
-
+def _build_service() -> NotebookRagService:
     load_env_file(ENV_PATH)
     if not _resolve_openai_api_key(raise_on_error=True):
         raise RuntimeError(
@@ -183,27 +208,258 @@ def _get_service() -> NotebookRagService:
 
     _validate_recipe_runtime_assets()
 
-    _service = NotebookRagService(NOTEBOOK_PATH)
-    return _service
+    return NotebookRagService(NOTEBOOK_PATH)
 
 
-def _load_catalog() -> pd.DataFrame:
-    global _catalog_dataframe
-    if _catalog_dataframe is not None:
-        return _catalog_dataframe
+def _warm_up_catalog() -> None:
+    try:
+        _load_catalog()
+    except Exception as exc:
+        logging.warning("No se pudo precargar el catalogo: %s", exc)
+
+
+def start_runtime_warmup() -> Future[NotebookRagService]:
+    """Arranca en segundo plano el runtime del notebook y el catalogo."""
+    global _service_future
+    with _service_future_lock:
+        if _service_future is None:
+            # El runtime reescribe chunks.csv de forma atomica, asi que el
+            # catalogo se puede precargar en paralelo sin leerlo a medias.
+            executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="recetona-warmup"
+            )
+            _service_future = executor.submit(_build_service)
+            executor.submit(_warm_up_catalog)
+            executor.shutdown(wait=False)
+        return _service_future
 
-    if CATALOG_CACHE_PATH.exists():
-        catalog_dataframe = pd.read_csv(CATALOG_CACHE_PATH)
-    elif EXCEL_PATH.exists():
-        catalog_dataframe = pd.read_excel(EXCEL_PATH)
-        catalog_dataframe["row_idx"] = np.arange(
-            len(catalog_dataframe), dtype=int
-        )
+
+def _forget_failed_service(service_future: Future) -> None:
+    # Un fallo de arranque no se memoriza: la siguiente llamada reintenta.
+    global _service_future
+    with _service_future_lock:
+        if _service_future is service_future:
+            _service_future = None
+
+
+async def _get_service_async() -> NotebookRagService:
+    service_future = start_runtime_warmup()
+    try:
+        return await asyncio.shield(asyncio.wrap_future(service_future))
+    except Exception:
+        _forget_failed_service(service_future)
+        raise
+
+
+@dataclass(frozen=True)
+class _CatalogTermPostings:
+    # Vocabulario ordenado y unido por "\n" en una sola cadena:
+    # term_starts[i] es el offset del termino i en vocabulary y sus filas son
+    # term_rows[term_row_offsets[i] : term_row_offsets[i + 1]].
+    vocabulary: str
+    term_starts: np.ndarray
+    term_row_offsets: np.ndarray
+    term_rows: np.ndarray
+    row_count: int
+
+
+def _build_catalog_term_postings(
+    catalog_dataframe: pd.DataFrame,
+) -> _CatalogTermPostings:
+    if "search_terms" in catalog_dataframe.columns:
+        row_terms = catalog_dataframe["search_terms"].tolist()
     else:
-        raise RuntimeError(
-            f"No existe catalogo en {CATALOG_CACHE_PATH} ni {EXCEL_PATH}."
-        )
+        row_terms = [
+            set(TOKEN_PATTERN.findall(search_text))
+            for search_text in catalog_dataframe["search_text"].tolist()
+        ]
+
+    postings: defaultdict[str, list[int]] = defaultdict(list)
+    for row_index, terms in enumerate(row_terms):
+        for term in terms:
+            postings[term].append(row_index)
+
+    terms = sorted(postings)
+    term_lengths = np.fromiter(
+        (len(term) + 1 for term in terms), dtype=np.int64, count=len(terms)
+    )
+    posting_lengths = np.fromiter(
+        (len(postings[term]) for term in terms),
+        dtype=np.int64,
+        count=len(terms),
+    )
+    return _CatalogTermPostings(
+        vocabulary="\n".join(terms),
+        term_starts=np.concatenate(([0], np.cumsum(term_lengths)[:-1])),
+        term_row_offsets=np.concatenate(([0], np.cumsum(posting_lengths))),
+        term_rows=np.fromiter(
+            (row for term in terms for row in postings[term]),
+            dtype=np.int32,
+            count=int(posting_lengths.sum()),
+        ),
+        row_count=len(catalog_dataframe),
+    )
+
+
+def _get_catalog_term_postings(
+    catalog_dataframe: pd.DataFrame,
+) -> _CatalogTermPostings:
+    if (
+        catalog_dataframe is _catalog_dataframe
+        and _catalog_term_postings is not None
+    ):
+        return _catalog_term_postings
+    return _build_catalog_term_postings(catalog_dataframe)
+
+
+def _match_token_rows(
+    token: str,
+    term_postings: _CatalogTermPostings,
+) -> np.ndarray:
+    # Un token [a-z0-9]+ aparece en search_text si y solo si es subcadena de
+    # alguno de sus terminos, asi que se conserva la semantica de
+    # str.contains sin recorrer todas las filas. Las coincidencias se buscan
+    # con str.find sobre el vocabulario unido (el separador impide que un
+    # token cruce dos terminos) y las filas se reunen de una vez con numpy.
+    vocabulary = term_postings.vocabulary
+    match_positions: list[int] = []
+    position = vocabulary.find(token)
+    while position != -1:
+        match_positions.append(position)
+        next_separator = vocabulary.find("\n", position)
+        if next_separator == -1:
+            break
+        position = vocabulary.find(token, next_separator + 1)
+
+    if not match_positions:
+        return np.empty(0, dtype=np.int32)
+
+    term_indices = (
+        np.searchsorted(term_postings.term_starts, match_positions, "right")
+        - 1
+    )
+    row_offsets = term_postings.term_row_offsets
+    if len(term_indices) == 1:
+        term_index = term_indices[0]
+        return term_postings.term_rows[
+            row_offsets[term_index] : row_offsets[term_index + 1]
+        ]
+
+    starts = row_offsets[term_indices]
+    lengths = row_offsets[term_indices + 1] - starts
+    gather_positions = np.repeat(
+        starts - np.cumsum(lengths) + lengths, lengths
+    ) + np.arange(lengths.sum())
+    row_mask = np.zeros(term_postings.row_count, dtype=bool)
+    row_mask[term_postings.term_rows[gather_positions]] = True
+    return np.flatnonzero(row_mask).astype(np.int32)
+
+
+def _build_catalog_id_index(
+    catalog_dataframe: pd.DataFrame,
+) -> tuple[dict[str, int], dict[str, int]]:
+    product_id_rows: dict[str, int] = {}
+    if "product_id" in catalog_dataframe.columns:
+        for row_position, value in enumerate(
+            catalog_dataframe["product_id"].tolist()
+        ):
+            product_id_rows.setdefault(_format_product_id(value), row_position)
+
+    row_idx_rows: dict[str, int] = {}
+    if "row_idx" in catalog_dataframe.columns:
+        for row_position, value in enumerate(
+            catalog_dataframe["row_idx"].tolist()
+        ):
+            row_idx_rows.setdefault(str(value), row_position)
+
+    return product_id_rows, row_idx_rows
+
+
+def _get_catalog_id_index(
+    catalog_dataframe: pd.DataFrame,
+) -> tuple[dict[str, int], dict[str, int]]:
+    if (
+        catalog_dataframe is _catalog_dataframe
+        and _catalog_id_index is not None
+    ):
+        return _catalog_id_index
+    return _build_catalog_id_index(catalog_dataframe)
+
+
+def _build_catalog_search_columns(
+    catalog_dataframe: pd.DataFrame,
+) -> dict[str, np.ndarray]:
+    # search solo necesita id, titulo y precio: se materializan una vez como
+    # arrays para que la consulta no toque pandas.
+    row_count = len(catalog_dataframe)
+    if "product_id" in catalog_dataframe.columns:
+        raw_product_ids = catalog_dataframe["product_id"].tolist()
+    elif "row_idx" in catalog_dataframe.columns:
+        raw_product_ids = catalog_dataframe["row_idx"].tolist()
+    else:
+        raw_product_ids = [""] * row_count
+    product_ids = [_format_product_id(value) for value in raw_product_ids]
+
+    if "product_name" in catalog_dataframe.columns:
+        raw_titles = catalog_dataframe["product_name"].fillna("").tolist()
+    else:
+        raw_titles = [""] * row_count
+    titles = [
+        str(raw_title).strip() or f"Producto {product_id}"
+        for raw_title, product_id in zip(raw_titles, product_ids)
+    ]
+
+    if "price_unit" in catalog_dataframe.columns:
+        prices = pd.to_numeric(
+            catalog_dataframe["price_unit"], errors="coerce"
+        ).to_numpy(dtype=np.float64)
+    else:
+        prices = np.full(row_count, np.nan)
+
+    return {
+        "product_id": np.asarray(product_ids, dtype=object),
+        "title": np.asarray(titles, dtype=object),
+        "price_unit": prices,
+    }
+
+
+def _get_catalog_search_columns(
+    catalog_dataframe: pd.DataFrame,
+) -> dict[str, np.ndarray]:
+    if (
+        catalog_dataframe is _catalog_dataframe
+        and _catalog_search_columns is not None
+    ):
+        return _catalog_search_columns
+    return _build_catalog_search_columns(catalog_dataframe)
+
+
+def _get_catalog_source_path() -> Path:
+    if CATALOG_CACHE_PATH.exists():
+        return CATALOG_CACHE_PATH
+    if EXCEL_PATH.exists():
+        return EXCEL_PATH
+    raise RuntimeError(
+        f"No existe catalogo en {CATALOG_CACHE_PATH} ni {EXCEL_PATH}."
+    )
+
+
+def _read_catalog_source(source_path: Path) -> pd.DataFrame:
+    if source_path.suffix == ".csv":
+        return pd.read_csv(source_path)
+
+    catalog_dataframe = pd.read_excel(source_path)
+    catalog_dataframe["row_idx"] = np.arange(len(catalog_dataframe), dtype=int)
+    return catalog_dataframe
+
+
+def _file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
 
+
+def _prepare_catalog_dataframe(
+    catalog_dataframe: pd.DataFrame,
+) -> pd.DataFrame:
     for column_name in (
         "product_name",
         "category",
@@ -225,9 +481,102 @@ def _load_catalog() -> pd.DataFrame:
         + " "
         + catalog_dataframe["ingredientes"].fillna("").astype(str)
     ).str.lower()
+    return catalog_dataframe
+
+
+def build_catalog_parquet(output_path: Path | None = None) -> Path:
+    output_path = output_path or CATALOG_PARQUET_PATH
+    source_path = _get_catalog_source_path()
+    catalog_dataframe = _prepare_catalog_dataframe(
+        _read_catalog_source(source_path)
+    )
+    catalog_dataframe["search_terms"] = [
+        sorted(set(TOKEN_PATTERN.findall(search_text)))
+        for search_text in catalog_dataframe["search_text"].tolist()
+    ]
+
+    table = pa.Table.from_pandas(catalog_dataframe, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            CATALOG_SOURCE_HASH_METADATA_KEY: _file_sha256(source_path).encode(
+                "ascii"
+            ),
+        }
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = output_path.with_name(f".{output_path.name}.tmp")
+    pq.write_table(table, temporary_path)
+    temporary_path.replace(output_path)
+    return output_path
 
-    _catalog_dataframe = catalog_dataframe
-    return _catalog_dataframe
+
+def _read_catalog_parquet(source_path: Path) -> pd.DataFrame | None:
+    if not CATALOG_PARQUET_PATH.exists():
+        return None
+
+    try:
+        metadata = pq.read_schema(CATALOG_PARQUET_PATH).metadata or {}
+        stored_hash = metadata.get(CATALOG_SOURCE_HASH_METADATA_KEY, b"")
+        if stored_hash.decode("ascii") != _file_sha256(source_path):
+            logging.warning(
+                "%s no corresponde a %s; se lee el catalogo original.",
+                CATALOG_PARQUET_PATH,
+                source_path,
+            )
+            return None
+
+        catalog_dataframe = pq.read_table(CATALOG_PARQUET_PATH).to_pandas()
+    except (pa.ArrowInvalid, OSError) as exc:
+        logging.warning(
+            "No se pudo leer %s (%s); se lee el catalogo original.",
+            CATALOG_PARQUET_PATH,
+            exc,
+        )
+        return None
+
+    if "search_text" not in catalog_dataframe.columns:
+        catalog_dataframe = _prepare_catalog_dataframe(catalog_dataframe)
+    return catalog_dataframe
+
+
+def _load_catalog() -> pd.DataFrame:
+    global _catalog_dataframe
+    global _catalog_term_postings
+    global _catalog_id_index
+    global _catalog_search_columns
+    if _catalog_dataframe is not None:
+        return _catalog_dataframe
+
+    with _catalog_lock:
+        if _catalog_dataframe is not None:
+            return _catalog_dataframe
+
+        _normalize.cache_clear()
+        _format_product_id_cached.cache_clear()
+        source_path = _get_catalog_source_path()
+        catalog_dataframe = _read_catalog_parquet(source_path)
+        if catalog_dataframe is None:
+            catalog_dataframe = _prepare_catalog_dataframe(
+                _read_catalog_source(source_path)
+            )
+
+        _catalog_term_postings = _build_catalog_term_postings(
+            catalog_dataframe
+        )
+        _catalog_id_index = _build_catalog_id_index(catalog_dataframe)
+        _catalog_search_columns = _build_catalog_search_columns(
+            catalog_dataframe
+        )
+        _catalog_dataframe = catalog_dataframe
+        return _catalog_dataframe
+
+
+async def _load_catalog_async() -> pd.DataFrame:
+    if _catalog_dataframe is not None:
+        return _catalog_dataframe
+    # La primera carga lee el CSV/XLSX: se hace fuera del event loop.
+    return await asyncio.to_thread(_load_catalog)
 
 
 def _row_to_fetch_payload(row: pd.Series) -> dict[str, Any]:
@@ -899,12 +1248,13 @@ def create_mcp(
         ),
         meta=_query_recipe_tool_meta(),
     )
-    def query_recipe(pregunta: str) -> Any:
+    async def query_recipe(pregunta: str) -> Any:
         pregunta_normalizada = str(pregunta).strip()
         if not pregunta_normalizada:
             raise ValueError("La pregunta no puede estar vacia.")
 
-        result = _get_service().ask(pregunta_normalizada)
+        service = await _get_service_async()
+        result = await service.ask_async(pregunta_normalizada)
         payload = _build_query_recipe_payload(
             pregunta=pregunta_normalizada,
             result=result,
@@ -923,55 +1273,58 @@ def create_mcp(
             openWorldHint=False,
         ),
     )
-    def search(query: str, limit: int = 8) -> dict[str, list[dict[str, str]]]:
+    async def search(
+        query: str, limit: int = 8
+    ) -> dict[str, list[dict[str, str]]]:
         normalized_query = str(query).strip()
         if not normalized_query:
             return {"results": []}
 
         bounded_limit = max(1, min(int(limit), 25))
-        catalog_dataframe = _load_catalog()
+        catalog_dataframe = await _load_catalog_async()
         tokens = [
             token
-            for token in re.findall(r"[a-z0-9]+", _normalize(normalized_query))
+            for token in TOKEN_PATTERN.findall(_normalize(normalized_query))
             if len(token) > 1
         ]
         if not tokens:
             return {"results": []}
 
-        scores = np.zeros(len(catalog_dataframe), dtype=np.int16)
-        for token in tokens:
-            scores += (
-                catalog_dataframe["search_text"]
-                .str.contains(re.escape(token), regex=True, na=False)
-                .to_numpy(dtype=np.int16)
-            )
+        term_postings = _get_catalog_term_postings(catalog_dataframe)
+        matched_rows = [
+            _match_token_rows(token, term_postings) for token in tokens
+        ]
+        scores = np.bincount(
+            np.concatenate(matched_rows),
+            minlength=len(catalog_dataframe),
+        ).astype(np.int16)
 
-        hit_indices = np.where(scores > 0)[0]
+        hit_indices = np.flatnonzero(scores)
         if len(hit_indices) == 0:
             return {"results": []}
 
-        scored_rows = catalog_dataframe.iloc[hit_indices].copy()
-        scored_rows["score"] = scores[hit_indices]
-        scored_rows = scored_rows.sort_values(
-            by=["score", "price_unit"],
-            ascending=[False, True],
-        ).head(bounded_limit)
-
-        results = []
-        for _, row in scored_rows.iterrows():
-            product_id = _format_product_id(
-                row.get("product_id", row.get("row_idx", ""))
+        # Orden estable por score descendente y precio ascendente (NaN al
+        # final), igual que el sort_values de pandas que sustituye.
+        search_columns = _get_catalog_search_columns(catalog_dataframe)
+        hit_order = np.lexsort(
+            (
+                search_columns["price_unit"][hit_indices],
+                -scores[hit_indices],
             )
-            title = str(
-                row.get("product_name", f"Producto {product_id}")
-            ).strip()
-            results.append(
-                {
-                    "id": product_id,
-                    "title": title,
-                    "url": f"recetona://producto/{product_id}",
-                }
+        )
+        top_rows = hit_indices[hit_order[:bounded_limit]]
+
+        results = [
+            {
+                "id": product_id,
+                "title": title,
+                "url": f"recetona://producto/{product_id}",
+            }
+            for product_id, title in zip(
+                search_columns["product_id"][top_rows].tolist(),
+                search_columns["title"][top_rows].tolist(),
             )
+        ]
 
         return {"results": results}
 
@@ -986,28 +1339,21 @@ def create_mcp(
             openWorldHint=False,
         ),
     )
-    def fetch(id: str) -> dict[str, Any]:
+    async def fetch(id: str) -> dict[str, Any]:
         requested_id = str(id).strip()
         if not requested_id:
             raise ValueError("El id no puede estar vacio.")
 
-        catalog_dataframe = _load_catalog()
-
-        product_identifier_column = catalog_dataframe.get(
-            "product_id",
-            pd.Series(dtype=object),
-        ).map(_format_product_id)
-        product_mask = product_identifier_column == requested_id
-        if product_mask.any():
-            row = catalog_dataframe[product_mask].iloc[0]
-            return _row_to_fetch_payload(row)
-
-        if "row_idx" in catalog_dataframe.columns:
-            row_index_as_text = catalog_dataframe["row_idx"].astype(str)
-            row_index_mask = row_index_as_text == requested_id
-            if row_index_mask.any():
-                row = catalog_dataframe[row_index_mask].iloc[0]
-                return _row_to_fetch_payload(row)
+        catalog_dataframe = await _load_catalog_async()
+        product_id_rows, row_idx_rows = _get_catalog_id_index(
+            catalog_dataframe
+        )
+
+        row_position = product_id_rows.get(requested_id)
+        if row_position is None:
+            row_position = row_idx_rows.get(requested_id)
+        if row_position is not None:
+            return _row_to_fetch_payload(catalog_dataframe.iloc[row_position])
 
         raise ValueError(f"No existe producto con id '{requested_id}'.")
 
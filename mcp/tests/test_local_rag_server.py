@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import sys
 import threading
 import types
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import msgpack
+import numpy as np
 import pandas as pd
+import pytest
+from starlette.testclient import TestClient
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
@@ -15,6 +22,21 @@ if str(PROJECT_ROOT) not in sys.path:
 import local_rag_server
 
 
+def _build_service(ask_agent, *, workers=1, cache_size=0, cache_ttl=0):
+    service = local_rag_server.NotebookRagService.__new__(
+        local_rag_server.NotebookRagService
+    )
+    service._pool = ThreadPoolExecutor(max_workers=workers)
+    service._response_cache = local_rag_server.AskResponseCache(
+        cache_size,
+        ttl_seconds=cache_ttl,
+    )
+    service._inflight = {}
+    service._inflight_lock = threading.RLock()
+    service._ask_agent = ask_agent
+    return service
+
+
 def test_ensure_runtime_rag_cache_downloads_missing_files(
     monkeypatch, tmp_path: Path
 ):
@@ -102,11 +124,191 @@ def test_build_notebook_runtime_overrides_chat_model(
     assert runtime["CHAT_MODEL"] == "gpt-5.4-nano"
 
 
-def test_notebook_rag_service_returns_cost_plan_and_summary():
-    service = local_rag_server.NotebookRagService.__new__(
-        local_rag_server.NotebookRagService
+def _write_fake_notebook(path: Path, answer: str) -> None:
+    cells = [
+        (
+            "from pathlib import Path\n"
+            "EMBED_MODEL = 'text-embedding-3-small'\n"
+            "CHAT_MODEL = 'gpt-4.1-mini'\n"
+            "BASE_DIR = Path('/home/wencm/RecetONA')\n"
+            "CACHE_DIR = BASE_DIR / 'rag_cache'\n"
+        ),
+        "def _clean(v):\n    return v\n",
+        "from types import SimpleNamespace as OpenAI\nclient = OpenAI()\n",
+        (
+            "def ensure_embeddings(chunks):\n    return []\n"
+            "chunks = []\n"
+            "embeddings = ensure_embeddings(chunks)\n"
+        ),
+        (
+            "def ask_agent(message, **kwargs):\n"
+            f"    return {{'answer': {answer!r}, 'base': str(BASE_DIR),"
+            " 'cache': str(CACHE_DIR)}\n"
+        ),
+    ]
+    notebook = {
+        "cells": [
+            {"cell_type": "markdown", "source": ["# Notas"]},
+            *(
+                {"cell_type": "code", "source": [cell], "outputs": []}
+                for cell in cells
+            ),
+        ]
+    }
+    path.write_text(json.dumps(notebook), encoding="utf-8")
+
+
+def test_extract_code_cells_skips_markdown_and_empty_cells(tmp_path: Path):
+    notebook_path = tmp_path / "notebook.ipynb"
+    notebook_path.write_text(
+        json.dumps(
+            {
+                "cells": [
+                    {"cell_type": "markdown", "source": ["# Título"]},
+                    {"cell_type": "code", "source": ["  \n"]},
+                    {
+                        "cell_type": "code",
+                        "source": ["x = 'ñ'\n", "y = x\n"],
+                        "outputs": [{"data": {"image/png": "iVBORw0"}}],
+                    },
+                ]
+            },
+            ensure_ascii=False,
+        ),
+        encoding="utf-8",
+    )
+
+    assert local_rag_server._extract_code_cells(notebook_path) == [
+        "x = 'ñ'\ny = x\n"
+    ]
+
+
+def test_build_notebook_runtime_imports_frozen_module(
+    monkeypatch, tmp_path: Path
+):
+    notebook_path = tmp_path / "notebook.ipynb"
+    module_path = tmp_path / "lib" / "recetona_runtime.py"
+    cache_dir = tmp_path / "runtime_cache"
+    _write_fake_notebook(notebook_path, "congelado")
+
+    local_rag_server.freeze_notebook_runtime(notebook_path, module_path)
+    monkeypatch.setattr(
+        local_rag_server, "NOTEBOOK_RUNTIME_MODULE_PATH", module_path
     )
-    service._lock = threading.Lock()
+    monkeypatch.setattr(
+        local_rag_server,
+        "ensure_runtime_rag_cache",
+        lambda **kwargs: {"cache_dir": cache_dir, "missing_files": []},
+    )
+
+    def fail_extract(notebook_path):
+        raise AssertionError("no deberia parsear el notebook")
+
+    monkeypatch.setattr(local_rag_server, "_extract_code_cells", fail_extract)
+
+    runtime = local_rag_server.build_notebook_runtime(notebook_path)
+    result = runtime["ask_agent"]("hola")
+
+    assert result["answer"] == "congelado"
+    assert result["base"] == str(local_rag_server.BASE_DIR)
+    assert result["cache"] == str(cache_dir)
+
+
+def test_build_notebook_runtime_ignores_stale_frozen_module(
+    monkeypatch, tmp_path: Path
+):
+    notebook_path = tmp_path / "notebook.ipynb"
+    module_path = tmp_path / "lib" / "recetona_runtime.py"
+    _write_fake_notebook(notebook_path, "antiguo")
+    local_rag_server.freeze_notebook_runtime(notebook_path, module_path)
+    _write_fake_notebook(notebook_path, "actual")
+
+    monkeypatch.setattr(
+        local_rag_server, "NOTEBOOK_RUNTIME_MODULE_PATH", module_path
+    )
+    monkeypatch.setattr(
+        local_rag_server,
+        "ensure_runtime_rag_cache",
+        lambda **kwargs: {"cache_dir": tmp_path, "missing_files": []},
+    )
+
+    runtime = local_rag_server.build_notebook_runtime(notebook_path)
+
+    assert runtime["ask_agent"]("hola")["answer"] == "actual"
+
+
+def test_build_notebook_runtime_reuses_marshalled_bytecode(
+    monkeypatch, tmp_path: Path
+):
+    notebook_path = tmp_path / "notebook.ipynb"
+    _write_fake_notebook(notebook_path, "compilado")
+    monkeypatch.setattr(
+        local_rag_server,
+        "NOTEBOOK_RUNTIME_MODULE_PATH",
+        tmp_path / "lib" / "recetona_runtime.py",
+    )
+    monkeypatch.setattr(
+        local_rag_server,
+        "ensure_runtime_rag_cache",
+        lambda **kwargs: {"cache_dir": tmp_path, "missing_files": []},
+    )
+    local_rag_server.build_notebook_runtime(notebook_path)
+    assert len(list(tmp_path.glob("runtime-*.pyc"))) == 1
+
+    def fail_extract_code_cells(notebook_path):
+        raise AssertionError("no deberia parsear el notebook")
+
+    monkeypatch.setattr(
+        local_rag_server, "_extract_code_cells", fail_extract_code_cells
+    )
+    runtime = local_rag_server.build_notebook_runtime(notebook_path)
+
+    assert runtime["ask_agent"]("hola")["answer"] == "compilado"
+
+
+def test_build_notebook_runtime_ignores_frozen_module_with_old_rules(
+    monkeypatch, tmp_path: Path
+):
+    notebook_path = tmp_path / "notebook.ipynb"
+    module_path = tmp_path / "lib" / "recetona_runtime.py"
+    _write_fake_notebook(notebook_path, "actual")
+    local_rag_server.freeze_notebook_runtime(notebook_path, module_path)
+    module_path.write_text(
+        module_path.read_text(encoding="utf-8").replace("actual", "antiguo"),
+        encoding="utf-8",
+    )
+
+    monkeypatch.setattr(
+        local_rag_server, "NOTEBOOK_RUNTIME_MODULE_PATH", module_path
+    )
+    monkeypatch.setattr(
+        local_rag_server, "_notebook_render_sha256", lambda: "reglas-nuevas"
+    )
+    monkeypatch.setattr(
+        local_rag_server,
+        "ensure_runtime_rag_cache",
+        lambda **kwargs: {"cache_dir": tmp_path, "missing_files": []},
+    )
+
+    runtime = local_rag_server.build_notebook_runtime(notebook_path)
+
+    assert runtime["ask_agent"]("hola")["answer"] == "actual"
+
+
+def test_committed_frozen_runtime_matches_notebook(tmp_path: Path):
+    module_path = local_rag_server.freeze_notebook_runtime(
+        local_rag_server.NOTEBOOK_PATH, tmp_path / "recetona_runtime.py"
+    )
+
+    assert module_path.read_text(encoding="utf-8") == (
+        local_rag_server.NOTEBOOK_RUNTIME_MODULE_PATH.read_text(
+            encoding="utf-8"
+        )
+    )
+
+
+def test_notebook_rag_service_returns_cost_plan_and_summary():
+    service = _build_service(None)
     service._ask_agent = lambda message, **kwargs: {
         "answer": "respuesta final",
         "block_1": "- 1 ud Chocolate puro Valor (5,25€)",
@@ -134,6 +336,445 @@ def test_notebook_rag_service_returns_cost_plan_and_summary():
     assert result["inferred_ingredients"] == ["chocolate"]
 
 
+def test_notebook_rag_service_runs_questions_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_ask_agent(message, **kwargs):
+        barrier.wait()
+        return {"answer": message}
+
+    service = _build_service(fake_ask_agent, workers=2)
+
+    with ThreadPoolExecutor(max_workers=2) as callers:
+        answers = list(
+            callers.map(
+                lambda message: service.ask(message)["answer"],
+                ["tarta de queso", "lentejas"],
+            )
+        )
+
+    assert answers == ["tarta de queso", "lentejas"]
+
+
+def test_notebook_rag_service_shares_inflight_identical_questions():
+    started = threading.Event()
+    release = threading.Event()
+    calls: list[str] = []
+
+    def fake_ask_agent(message, **kwargs):
+        calls.append(message)
+        started.set()
+        release.wait(timeout=5)
+        return {"answer": "respuesta"}
+
+    service = _build_service(fake_ask_agent, workers=2)
+    joined = threading.Event()
+    submit_question = service._submit_question
+
+    def tracking_submit_question(cache_key, message):
+        future, is_owner = submit_question(cache_key, message)
+        if not is_owner:
+            joined.set()
+        return future, is_owner
+
+    service._submit_question = tracking_submit_question
+
+    with ThreadPoolExecutor(max_workers=2) as callers:
+        first = callers.submit(service.ask, "Lentejas")
+        assert started.wait(timeout=5)
+        second = callers.submit(service.ask, " lentejas ")
+        assert joined.wait(timeout=5)
+        release.set()
+        answers = [first.result()["answer"], second.result()["answer"]]
+
+    assert answers == ["respuesta", "respuesta"]
+    assert calls == ["Lentejas"]
+    assert service._inflight == {}
+
+
+def test_cancelled_async_question_does_not_cancel_joined_callers():
+    release = threading.Event()
+    busy = threading.Event()
+
+    def fake_ask_agent(message, **kwargs):
+        if message == "bloqueo":
+            busy.set()
+            release.wait(timeout=5)
+        return {"answer": message}
+
+    service = _build_service(fake_ask_agent, workers=1)
+    joined = threading.Event()
+    submit_question = service._submit_question
+
+    def tracking_submit_question(cache_key, message):
+        future, is_owner = submit_question(cache_key, message)
+        if not is_owner:
+            joined.set()
+        return future, is_owner
+
+    service._submit_question = tracking_submit_question
+
+    async def cancel_owner_while_queued():
+        loop = asyncio.get_running_loop()
+        blocker = loop.run_in_executor(None, service.ask, "bloqueo")
+        assert await asyncio.to_thread(busy.wait, 5)
+        owner = asyncio.create_task(service.ask_async("lentejas"))
+        while "lentejas" not in service._inflight:
+            await asyncio.sleep(0)
+        joiner = loop.run_in_executor(None, service.ask, "lentejas")
+        assert await asyncio.to_thread(joined.wait, 5)
+
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        release.set()
+        await blocker
+        return await joiner
+
+    assert asyncio.run(cancel_owner_while_queued()) == {
+        "answer": "lentejas",
+        "block_1": "",
+        "block_2": "",
+        "block_3": "",
+        "cost_plan": None,
+        "cost_summary": None,
+        "inferred_ingredients": None,
+    }
+
+
+def test_notebook_rag_service_caches_normalized_questions():
+    calls: list[str] = []
+
+    def fake_ask_agent(message, **kwargs):
+        calls.append(message)
+        return {
+            "answer": "respuesta",
+            "cost_plan": pd.DataFrame([{"product_name": "Lentejas"}]),
+            "raw_response": object(),
+        }
+
+    service = _build_service(fake_ask_agent, cache_size=8)
+
+    first = service.ask("Lentejas  para 4")
+    first["cost_plan"].loc[0, "product_name"] = "modificado"
+    second = service.ask("  lentejas para 4 ")
+
+    assert calls == ["Lentejas  para 4"]
+    assert second["answer"] == "respuesta"
+    assert list(second["cost_plan"]["product_name"]) == ["Lentejas"]
+
+
+def test_notebook_rag_service_skips_cache_when_block3_failed():
+    calls: list[str] = []
+
+    def fake_ask_agent(message, **kwargs):
+        calls.append(message)
+        if len(calls) == 1:
+            return {
+                "answer": "degradada",
+                "block_3": "No se pudo generar el texto de receta "
+                "automáticamente (timeout).",
+                "raw_response": None,
+            }
+        return {"answer": "completa", "raw_response": object()}
+
+    service = _build_service(fake_ask_agent, cache_size=8)
+
+    assert service.ask("lentejas")["answer"] == "degradada"
+    assert service.ask("lentejas")["answer"] == "completa"
+    assert service.ask("lentejas")["answer"] == "completa"
+    assert calls == ["lentejas", "lentejas"]
+
+
+def test_ask_response_cache_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(local_rag_server.time, "monotonic", lambda: now[0])
+    cache = local_rag_server.AskResponseCache(2, ttl_seconds=10)
+
+    cache.put("a", {"answer": "a"})
+    cache.put("b", {"answer": "b"})
+    assert cache.get("a") == {"answer": "a"}
+    cache.put("c", {"answer": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"answer": "a"}
+
+    now[0] = 111.0
+    assert cache.get("a") is None
+
+
+def test_get_runtime_workers_falls_back_on_invalid_value(monkeypatch):
+    monkeypatch.setenv("RECETONA_WORKERS", "muchos")
+    assert local_rag_server.get_runtime_workers() == 4
+
+    monkeypatch.setenv("RECETONA_WORKERS", "0")
+    assert local_rag_server.get_runtime_workers() == 1
+
+
+def test_chat_endpoint_serializes_cost_plan():
+    service = _build_service(None)
+    service._ask_agent = lambda message, **kwargs: {
+        "answer": "respuesta final",
+        "cost_plan": pd.DataFrame(
+            [{"product_name": "Lentejas", "price_unit": float("nan")}]
+        ),
+    }
+    client = TestClient(local_rag_server.build_local_api_app(service))
+
+    response = client.post(
+        "/chat",
+        json={"message": "lentejas"},
+        headers={"Origin": "http://127.0.0.1:8080"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "*"
+    payload = response.json()
+    assert payload["answer"] == "respuesta final"
+    assert payload["cost_plan"] == [
+        {"product_name": "Lentejas", "price_unit": None}
+    ]
+
+
+def test_chat_endpoint_reports_serialization_errors_as_json():
+    service = _build_service(None)
+    service._ask_agent = lambda message, **kwargs: {
+        "answer": "respuesta final",
+        "cost_summary": {"generado": pd.Timestamp("2026-01-01")},
+    }
+    client = TestClient(local_rag_server.build_local_api_app(service))
+
+    response = client.post(
+        "/chat",
+        json={"message": "lentejas"},
+        headers={"Origin": "http://127.0.0.1:8080"},
+    )
+
+    assert response.status_code == 500
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert "serializable" in response.json()["error"]
+
+
+def test_chat_endpoint_negotiates_msgpack():
+    service = _build_service(None)
+    service._ask_agent = lambda message, **kwargs: {
+        "answer": "respuesta final",
+        "cost_plan": pd.DataFrame(
+            [{"product_name": "Lentejas", "price_unit": np.float64(1.25)}]
+        ),
+    }
+    client = TestClient(local_rag_server.build_local_api_app(service))
+
+    response = client.post(
+        "/chat",
+        json={"message": "lentejas"},
+        headers={"Accept": "application/msgpack"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    payload = msgpack.unpackb(response.content)
+    assert payload["answer"] == "respuesta final"
+    assert payload["cost_plan"] == [
+        {"product_name": "Lentejas", "price_unit": 1.25}
+    ]
+
+
+def test_prefers_msgpack_honours_accept_quality():
+    assert local_rag_server._prefers_msgpack("application/msgpack")
+    assert local_rag_server._prefers_msgpack(
+        "application/json;q=0.5, application/msgpack"
+    )
+    assert not local_rag_server._prefers_msgpack("application/msgpack;q=0")
+    assert not local_rag_server._prefers_msgpack(
+        "application/msgpack;q=0.2, */*;q=0.8"
+    )
+    assert not local_rag_server._prefers_msgpack("*/*")
+    assert not local_rag_server._prefers_msgpack("")
+
+
+def test_load_runtime_embeddings_keeps_float32_by_default(
+    monkeypatch, tmp_path: Path
+):
+    monkeypatch.delenv(local_rag_server.EMBEDDINGS_FP16_ENV, raising=False)
+    embeddings = np.array([[0.6, 0.8], [1.0, 0.0]], dtype=np.float32)
+
+    loaded = local_rag_server.load_runtime_embeddings(
+        lambda chunks_df: embeddings,
+        pd.DataFrame({"text": ["a", "b"]}),
+        embeddings_path=tmp_path / "embeddings.npy",
+    )
+
+    assert loaded is embeddings
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_load_runtime_embeddings_maps_float16_copy(
+    monkeypatch, tmp_path: Path
+):
+    monkeypatch.setenv(local_rag_server.EMBEDDINGS_FP16_ENV, "1")
+    embeddings = np.array([[0.6, 0.8], [1.0, 0.0]], dtype=np.float32)
+    calls = []
+
+    def fake_ensure_embeddings(chunks_df):
+        calls.append(len(chunks_df))
+        return embeddings
+
+    chunks = pd.DataFrame({"text": ["a", "b"]})
+    embeddings_path = tmp_path / "embeddings.npy"
+    first = local_rag_server.load_runtime_embeddings(
+        fake_ensure_embeddings, chunks, embeddings_path=embeddings_path
+    )
+    second = local_rag_server.load_runtime_embeddings(
+        fake_ensure_embeddings, chunks, embeddings_path=embeddings_path
+    )
+
+    assert calls == [2]
+    assert isinstance(second, np.memmap)
+    assert second.dtype == np.float16
+    np.testing.assert_allclose(first, embeddings, atol=1e-3)
+
+
+def test_semantic_scores_from_embeddings_matches_float32_dot():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(50, 8)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = rng.normal(size=(3, 8)).astype(np.float32)
+
+    for matrix, atol in (
+        (embeddings, 1e-6),
+        (embeddings.astype(np.float16), 1e-3),
+    ):
+        scores = local_rag_server.semantic_scores_from_embeddings(
+            matrix, queries, block_rows=16
+        )
+
+        assert len(scores) == 3
+        for query_vector, score in zip(queries, scores):
+            query_vector = query_vector / np.linalg.norm(query_vector)
+            expected = (embeddings @ query_vector + 1.0) / 2.0
+            np.testing.assert_allclose(score, expected, atol=atol)
+
+
+def test_save_runtime_chunks_replaces_csv_atomically(tmp_path: Path):
+    chunks_path = tmp_path / "chunks.csv"
+    chunks_path.write_text("row_idx\n99\n", encoding="utf-8")
+
+    local_rag_server.save_runtime_chunks(
+        pd.DataFrame([{"row_idx": 0}, {"row_idx": 1}]), chunks_path
+    )
+
+    assert pd.read_csv(chunks_path)["row_idx"].tolist() == [0, 1]
+    assert [path.name for path in tmp_path.iterdir()] == ["chunks.csv"]
+    assert "__RECETONA_SAVE_CHUNKS__(chunks, CHUNKS_CSV)" in (
+        local_rag_server.render_notebook_runtime_source(
+            ["chunks.to_csv(CHUNKS_CSV, index=False)"]
+        )
+    )
+
+
+def test_top_k_indices_matches_full_argsort():
+    scores = np.array([0.2, 0.9, 0.1, 0.7, 0.5], dtype=np.float32)
+
+    assert local_rag_server.top_k_indices(scores, 3).tolist() == [1, 3, 4]
+    assert local_rag_server.top_k_indices(scores, 10).tolist() == [
+        1,
+        3,
+        4,
+        0,
+        2,
+    ]
+    assert local_rag_server.top_k_indices(scores, 0).tolist() == []
+    assert "__RECETONA_TOP_K__(hybrid_best, top_k)" in (
+        local_rag_server.render_notebook_runtime_source(
+            ["top_idx = np.argsort(-hybrid_best)[:top_k]"]
+        )
+    )
+
+
+def test_lexical_index_patch_matches_notebook_loops():
+    doc_tokens = [
+        ["aceite", "oliva", "aceite"],
+        ["leche", "entera"],
+        ["aceite", "girasol"],
+        ["oliva", "negra", "aceite"],
+    ]
+    postings: dict[str, list[tuple[int, int]]] = {}
+    doc_freq: dict[str, int] = {}
+    for doc_index, tokens in enumerate(doc_tokens):
+        for token in dict.fromkeys(tokens):
+            postings.setdefault(token, []).append(
+                (doc_index, tokens.count(token))
+            )
+            doc_freq[token] = doc_freq.get(token, 0) + 1
+
+    def notebook_tfidf(q_tokens):
+        scores = np.zeros(len(doc_tokens), dtype=np.float32)
+        for token in dict.fromkeys(q_tokens):
+            idf = np.log((len(doc_tokens) + 1) / (doc_freq[token] + 1)) + 1
+            q_weight = 1.0 + np.log(q_tokens.count(token))
+            for doc_index, tf in postings.get(token, []):
+                scores[doc_index] += q_weight * (1.0 + np.log(tf)) * idf
+        return scores / scores.max()
+
+    namespace = {
+        "POSTINGS": postings,
+        "N_DOCS": len(doc_tokens),
+        "ING_NAME_POSTINGS": postings,
+        "STOPWORDS": {"de"},
+        "tokenize": lambda text: text.split(),
+        "_tfidf_scores_index": lambda *args: None,
+        "_ingredient_token_masks": lambda ingredient: None,
+    }
+    local_rag_server._patch_lexical_indexes(namespace)
+
+    scores = namespace["_tfidf_scores_index"](
+        ["aceite", "oliva", "oliva"], postings, doc_freq
+    )
+    np.testing.assert_allclose(
+        scores, notebook_tfidf(["aceite", "oliva", "oliva"]), rtol=1e-6
+    )
+    any_mask, all_mask = namespace["_ingredient_token_masks"](
+        "aceite de oliva"
+    )
+    assert any_mask.tolist() == [True, False, True, True]
+    assert all_mask.tolist() == [True, False, False, True]
+
+
+def test_local_api_reports_health_and_request_errors():
+    client = TestClient(local_rag_server.build_local_api_app(None))
+
+    assert client.get("/health").json() == {
+        "ok": True,
+        "service": "recetona-local-rag",
+    }
+    assert client.get("/chat").status_code == 404
+    assert client.get("/otra").json() == {"error": "Ruta no encontrada"}
+    assert client.post("/chat", content=b"{").status_code == 400
+    assert client.post("/chat", content=b"\xff").status_code == 400
+    assert client.post("/chat", json=["hola"]).status_code == 400
+    assert client.post("/chat", json={"message": " "}).status_code == 400
+    assert client.post("/chat", json={"message": "hola"}).status_code == 503
+
+
+def test_local_api_answers_cors_preflight():
+    client = TestClient(local_rag_server.build_local_api_app(None))
+
+    response = client.options(
+        "/chat",
+        headers={
+            "Origin": "http://127.0.0.1:8080",
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "Content-Type",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert client.options("/chat").json() == {"ok": True}
+    assert client.options("/otra").status_code == 200
+
+
 def test_filter_incompatible_ingredient_candidates_drops_pastry_for_nuts():
     df_hits = pd.DataFrame(
         [
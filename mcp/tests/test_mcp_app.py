@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import asyncio
 import sys
+import time
 import types
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pytest
 from starlette.testclient import TestClient
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -138,3 +143,289 @@ def test_query_recipe_tool_meta_links_widget_template():
 
     assert meta["ui"]["resourceUri"] == mcp_app.RECIPE_WIDGET_URI
     assert meta["openai/outputTemplate"] == mcp_app.RECIPE_WIDGET_URI
+
+
+def _write_catalog_csv(monkeypatch, tmp_path: Path) -> None:
+    catalog_path = tmp_path / "chunks.csv"
+    pd.DataFrame(
+        [
+            {
+                "row_idx": 0,
+                "product_id": 10.0,
+                "product_name": "Tomate triturado Hacendado",
+                "category": "Conservas",
+                "price_unit": 0.9,
+            },
+            {
+                "row_idx": 1,
+                "product_id": 11.0,
+                "product_name": "Tomates cherry",
+                "category": "Fruta y verdura",
+                "price_unit": 1.5,
+            },
+            {
+                "row_idx": 2,
+                "product_id": 12.0,
+                "product_name": "Tomate frito",
+                "category": "Conservas",
+                "price_unit": 0.7,
+            },
+            {
+                "row_idx": 3,
+                "product_id": 13.0,
+                "product_name": "Leche entera",
+                "category": "Lacteos",
+                "price_unit": 0.95,
+            },
+        ]
+    ).to_csv(catalog_path, index=False)
+    monkeypatch.setattr(mcp_app, "CATALOG_CACHE_PATH", catalog_path)
+    monkeypatch.setattr(
+        mcp_app, "CATALOG_PARQUET_PATH", tmp_path / "catalog.parquet"
+    )
+    monkeypatch.setattr(mcp_app, "_catalog_dataframe", None)
+    monkeypatch.setattr(mcp_app, "_catalog_term_postings", None)
+    monkeypatch.setattr(mcp_app, "_catalog_id_index", None)
+    monkeypatch.setattr(mcp_app, "_catalog_search_columns", None)
+
+
+def _get_tool_function(name: str):
+    return mcp_app.create_mcp()._tool_manager.get_tool(name).fn
+
+
+def test_search_ranks_by_token_hits_then_price(monkeypatch, tmp_path: Path):
+    _write_catalog_csv(monkeypatch, tmp_path)
+    search = _get_tool_function("search")
+
+    response = asyncio.run(search("tomate triturado", limit=5))
+
+    assert [item["id"] for item in response["results"]] == ["10", "12", "11"]
+    assert response["results"][0] == {
+        "id": "10",
+        "title": "Tomate triturado Hacendado",
+        "url": "recetona://producto/10",
+    }
+
+
+def test_search_matches_partial_tokens_like_substring_search(
+    monkeypatch, tmp_path: Path
+):
+    _write_catalog_csv(monkeypatch, tmp_path)
+    search = _get_tool_function("search")
+
+    response = asyncio.run(search("tritur lact", limit=5))
+
+    assert [item["id"] for item in response["results"]] == ["10", "13"]
+    assert asyncio.run(search("zzz"))["results"] == []
+
+
+def test_search_falls_back_to_generic_title_without_name(
+    monkeypatch, tmp_path: Path
+):
+    catalog_path = tmp_path / "chunks.csv"
+    pd.DataFrame(
+        [
+            {
+                "row_idx": 0,
+                "product_id": 7,
+                "category": "Conservas",
+                "price_unit": 1.0,
+            }
+        ]
+    ).to_csv(catalog_path, index=False)
+    monkeypatch.setattr(mcp_app, "CATALOG_CACHE_PATH", catalog_path)
+    monkeypatch.setattr(mcp_app, "_catalog_dataframe", None)
+    monkeypatch.setattr(mcp_app, "_catalog_term_postings", None)
+    monkeypatch.setattr(mcp_app, "_catalog_id_index", None)
+    monkeypatch.setattr(mcp_app, "_catalog_search_columns", None)
+    search = _get_tool_function("search")
+
+    response = asyncio.run(search("conservas"))
+
+    assert response["results"] == [
+        {
+            "id": "7",
+            "title": "Producto 7",
+            "url": "recetona://producto/7",
+        }
+    ]
+
+
+def test_fetch_resolves_product_id_and_row_index(monkeypatch, tmp_path: Path):
+    _write_catalog_csv(monkeypatch, tmp_path)
+    fetch = _get_tool_function("fetch")
+
+    by_product_id = asyncio.run(fetch("12"))
+    by_row_index = asyncio.run(fetch("3"))
+
+    assert by_product_id["title"] == "Tomate frito"
+    assert by_product_id["url"] == "recetona://producto/12"
+    assert by_row_index["title"] == "Leche entera"
+    with pytest.raises(ValueError):
+        asyncio.run(fetch("999"))
+
+
+def test_format_product_id_accepts_unhashable_and_numpy_values():
+    assert mcp_app._format_product_id(10.0) == "10"
+    assert mcp_app._format_product_id(np.int64(7)) == "7"
+    assert mcp_app._format_product_id(np.float64(3.5)) == "3.5"
+    assert mcp_app._format_product_id(" abc ") == "abc"
+    assert mcp_app._format_product_id(["x"]) == "['x']"
+
+
+def test_load_catalog_reads_parquet_built_from_current_source(
+    monkeypatch, tmp_path: Path
+):
+    _write_catalog_csv(monkeypatch, tmp_path)
+    mcp_app.build_catalog_parquet()
+
+    def fail_read_csv(*args, **kwargs):
+        raise AssertionError("No deberia leer el CSV con Parquet vigente")
+
+    monkeypatch.setattr(mcp_app.pd, "read_csv", fail_read_csv)
+    catalog_dataframe = mcp_app._load_catalog()
+
+    assert catalog_dataframe["product_name"].tolist()[0] == (
+        "Tomate triturado Hacendado"
+    )
+    assert catalog_dataframe["search_text"].tolist()[3] == (
+        "leche entera lacteos   "
+    )
+    assert list(catalog_dataframe["search_terms"].tolist()[3]) == [
+        "entera",
+        "lacteos",
+        "leche",
+    ]
+    search = _get_tool_function("search")
+    assert [
+        item["id"] for item in asyncio.run(search("leche"))["results"]
+    ] == ["13"]
+
+
+def test_load_catalog_ignores_stale_parquet(monkeypatch, tmp_path: Path):
+    _write_catalog_csv(monkeypatch, tmp_path)
+    mcp_app.build_catalog_parquet()
+    catalog_path = tmp_path / "chunks.csv"
+    pd.DataFrame(
+        [{"row_idx": 0, "product_id": 20.0, "product_name": "Pan"}]
+    ).to_csv(catalog_path, index=False)
+
+    catalog_dataframe = mcp_app._load_catalog()
+
+    assert catalog_dataframe["product_name"].tolist() == ["Pan"]
+
+
+def test_load_catalog_falls_back_on_corrupt_parquet(
+    monkeypatch, tmp_path: Path
+):
+    _write_catalog_csv(monkeypatch, tmp_path)
+    (tmp_path / "catalog.parquet").write_bytes(b"no es un parquet")
+
+    catalog_dataframe = mcp_app._load_catalog()
+
+    assert catalog_dataframe["product_name"].tolist()[0] == (
+        "Tomate triturado Hacendado"
+    )
+
+
+def test_get_service_reuses_warmup_and_retries_after_failure(monkeypatch):
+    attempts = []
+    service = object()
+
+    def fake_build_service():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise RuntimeError("Falta OPENAI_API_KEY")
+        return service
+
+    monkeypatch.setattr(mcp_app, "_build_service", fake_build_service)
+    monkeypatch.setattr(mcp_app, "_load_catalog", lambda: None)
+    monkeypatch.setattr(mcp_app, "_service_future", None)
+
+    with pytest.raises(RuntimeError):
+        mcp_app.start_runtime_warmup().result()
+    with pytest.raises(RuntimeError):
+        asyncio.run(mcp_app._get_service_async())
+
+    assert asyncio.run(mcp_app._get_service_async()) is service
+    assert asyncio.run(mcp_app._get_service_async()) is service
+    assert attempts == [0, 1]
+
+
+def test_load_catalog_loads_once_without_waiting_for_runtime(
+    monkeypatch, tmp_path: Path
+):
+    _write_catalog_csv(monkeypatch, tmp_path)
+    monkeypatch.setattr(mcp_app, "_service_future", Future())
+    read_csv_calls = []
+    read_csv = mcp_app.pd.read_csv
+
+    def counting_read_csv(*args, **kwargs):
+        read_csv_calls.append(args)
+        time.sleep(0.1)
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(mcp_app.pd, "read_csv", counting_read_csv)
+
+    with ThreadPoolExecutor(max_workers=2) as callers:
+        loads = [callers.submit(mcp_app._load_catalog) for _ in range(2)]
+        catalogs = [load.result(timeout=5) for load in loads]
+
+    assert catalogs[0] is catalogs[1]
+    assert len(read_csv_calls) == 1
+
+
+def test_search_tool_does_not_block_event_loop_while_loading(
+    monkeypatch, tmp_path: Path
+):
+    _write_catalog_csv(monkeypatch, tmp_path)
+    monkeypatch.setattr(mcp_app, "_service_future", Future())
+    read_csv = mcp_app.pd.read_csv
+
+    def slow_read_csv(*args, **kwargs):
+        time.sleep(0.5)
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(mcp_app.pd, "read_csv", slow_read_csv)
+    mcp = mcp_app.create_mcp()
+
+    async def timed_sleep():
+        started_at = time.monotonic()
+        await asyncio.sleep(0.05)
+        return time.monotonic() - started_at
+
+    async def search_while_sleeping():
+        return await asyncio.gather(
+            mcp.call_tool("search", {"query": "leche"}),
+            timed_sleep(),
+        )
+
+    _, slept = asyncio.run(search_while_sleeping())
+
+    assert slept < 0.3
+
+
+def test_query_recipe_tool_awaits_service_without_blocking(monkeypatch):
+    class FakeService:
+        async def ask_async(self, pregunta):
+            await asyncio.sleep(0.3)
+            return {"answer": pregunta, "block_1": "", "block_3": ""}
+
+    service_future: Future = Future()
+    service_future.set_result(FakeService())
+    monkeypatch.setattr(mcp_app, "_service_future", service_future)
+    mcp = mcp_app.create_mcp()
+
+    async def ask_four_questions():
+        return await asyncio.gather(
+            *(
+                mcp.call_tool("query_recipe", {"pregunta": f"receta {index}"})
+                for index in range(4)
+            )
+        )
+
+    started_at = time.monotonic()
+    results = asyncio.run(ask_four_questions())
+
+    assert time.monotonic() - started_at < 1.0
+    assert len(results) == 4